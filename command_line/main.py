@@ -1,4 +1,6 @@
 import argparse
+import re
+from functools import lru_cache
 from pathlib import Path
 
 from methods import Method
@@ -9,6 +11,44 @@ from declarative_parser.types import Slice, one_of, Indices, dsv, Range
 from declarative_parser.constructor_parser import ConstructorParser
 
 
+HELP_ARGS = frozenset({'-h', '--help'})
+
+# the registry of methods is bound once; this is the very same dict
+# (not a copy), so methods registered later are still available
+METHODS = Method.members
+
+# files with expression data tend to be large: reading
+# them in bigger chunks reduces the number of system calls
+expression_file = argparse.FileType('r', bufsize=2 ** 20)
+
+# tries all of the column selection types, one after another
+any_columns_selection = one_of(Slice, Indices, Range)
+
+# syntax of the column selection types, e.g. "1,2,3", ":4" or "1-3"
+COLUMNS_SELECTION_SYNTAX = [
+    (re.compile(r'\d+(,\d+)*$'), Indices),
+    (re.compile(r'-?\d*:-?\d*$'), Slice),
+    (re.compile(r'\d+-\d+$'), Range)
+]
+
+
+# a single type shared by all the arguments selecting columns from files;
+# the same selection is often given for many files, hence the cache
+@lru_cache(maxsize=None)
+def columns_selection(string):
+    """Create Indices, Slice or Range, depending on the syntax of `string`.
+
+    The type is chosen by matching the syntax upfront, rather than by
+    trying the types one by one and catching exceptions. Any string
+    not matching the simple patterns is handed over to `one_of`, which
+    will report a helpful error if none of the types accepts it.
+    """
+    for pattern, selection_type in COLUMNS_SELECTION_SYNTAX:
+        if pattern.match(string):
+            return selection_type(string)
+    return any_columns_selection(string)
+
+
 class SampleCollectionFactory(Parser):
     """Provide {parser_name} samples. Requires a file (or files) with samples.
 
@@ -21,7 +61,7 @@ class SampleCollectionFactory(Parser):
      """
 
     files = Argument(
-        type=argparse.FileType('r'),
+        type=expression_file,
         # at least one file is always required
         nargs='+',
         optional=False
@@ -41,7 +81,7 @@ class SampleCollectionFactory(Parser):
 
     columns = Argument(
         # we want to handle either ":4", "5:" or even "1,2,3"
-        type=one_of(Slice, Indices, Range),
+        type=columns_selection,
         # user may (but do not have to) specify columns
         # to be extracted from given file(s).
         nargs='*',
@@ -110,9 +150,31 @@ class SampleCollectionFactory(Parser):
             if callable(opts.header):
                 opts.header = [opts.header(f) for f in opts.files]
 
-            for i, file_obj in enumerate(opts.files):
+            # resolve per-file options once, before looping over the files
+            not_selected = [None] * len(opts.files)
+
+            if opts.columns:
+                columns_selectors = [columns.get_iterator for columns in opts.columns]
+            else:
+                columns_selectors = not_selected
+
+            samples = opts.samples or not_selected
+
+            # `--header` given without values: use the default (names
+            # from the first non-empty line) rather than skip all files
+            headers = opts.header or [0] * len(opts.files)
+
+            # options which are the same for all files
+            common_options = dict(
+                delimiter=opts.delimiter,
+                description_column=opts.description_column
+            )
 
-                use_header = isinstance(opts.header[i], int)
+            per_file_options = zip(opts.files, columns_selectors, samples, headers)
+
+            for i, (file_obj, columns_selector, file_samples, header) in enumerate(per_file_options):
+
+                use_header = isinstance(header, int)
 
                 constructor = SampleCollection.from_file
 
@@ -125,18 +187,16 @@ class SampleCollectionFactory(Parser):
                     constructor(
                         f'Sample collection, part {i} of {name}',
                         file_obj,
-                        columns_selector=opts.columns[i].get_iterator if opts.columns else None,
-                        samples=opts.samples[i] if opts.samples else None,
-                        reverse_selection=getattr(opts, 'reverse', False),
-                        delimiter=opts.delimiter,
-                        header_line=opts.header[i] if use_header else None,
+                        columns_selector=columns_selector,
+                        samples=file_samples,
+                        header_line=header if use_header else None,
                         use_header=use_header,
-                        prefix=opts.header[i] if not use_header else None,
-                        description_column=opts.description_column
+                        prefix=header if not use_header else None,
+                        **common_options
                     )
                 )
 
-            opts.sample_collection = sum(sample_collections, SampleCollection(name))
+            opts.sample_collection = SampleCollection.merge(name, sample_collections)
         return opts
 
 
@@ -159,18 +219,18 @@ class SingleFileExperimentFactory(Parser):
 
     # exactly one file is required
     files = Argument(
-        type=argparse.FileType('r'),
+        type=expression_file,
         nargs=1,    # transforms result into a single-element list
         optional=False,
         help='file with samples for both control and cases.'
     )
     case = Argument(
-        type=one_of(Slice, Indices, Range),
+        type=columns_selection,
         nargs=1,
         help='columns from which case samples should be extracted.'
     )
     control = Argument(
-        type=one_of(Slice, Indices, Range),
+        type=columns_selection,
         nargs=1,
         help='columns from which control samples should be extracted.',
     )
@@ -179,39 +239,56 @@ class SingleFileExperimentFactory(Parser):
 
         opts = self.namespace
 
-        def produce_collection_of_samples(created_group, other_group):
-            reverse = hasattr(opts, 'reverse_' + created_group)
-            get_columns_from = created_group
-            if reverse:
-                get_columns_from = other_group
+        def produce_collection_of_samples(name, columns, reverse, samples):
+            # there is exactly one file, so there is one columns selector
+            columns_selector = columns[0]
+            selected = set(
+                columns_selector.get_iterator(list(range(len(samples))))
+            )
+
+            chosen_samples = [
+                sample
+                for column, sample in enumerate(samples)
+                if (column in selected) != reverse
+            ]
 
-            return SampleCollectionFactory(
-                name=created_group,
-                files=opts.files,
-                columns=getattr(opts, get_columns_from),
-                reverse=reverse
-            ).produce()
+            return argparse.Namespace(
+                name=name,
+                sample_collection=SampleCollection(name, chosen_samples)
+            )
 
         if opts.files:
-            if not (opts.case and opts.control):
-                if opts.case:
-                    opts.reverse_control = True
-                elif opts.control:
-                    opts.reverse_case = True
-                else:
-                    raise ValueError(
-                        'Neither --case nor --control provided: '
-                        'please specify which columns should be used as control '
-                        'and which should be used as the case.'
-                    )
+            # a group without columns of its own gets all the other columns
+            reverse_case = not opts.case
+            reverse_control = not opts.control
+
+            if reverse_case and reverse_control:
+                raise ValueError(
+                    'Neither --case nor --control provided: '
+                    'please specify which columns should be used as control '
+                    'and which should be used as the case.'
+                )
+
+            # read the file only once, then divide samples into the groups
+            all_samples = SampleCollectionFactory(
+                name='data',
+                files=opts.files
+            ).produce().sample_collection.samples
 
             collections = {
-                'control': produce_collection_of_samples('control', 'case')
+                'control': produce_collection_of_samples(
+                    'control',
+                    opts.case if reverse_control else opts.control,
+                    reverse_control,
+                    all_samples
+                ),
+                'case': produce_collection_of_samples(
+                    'case',
+                    opts.control if reverse_case else opts.case,
+                    reverse_case,
+                    all_samples
+                )
             }
-            # reuse the same file(s)
-            for f in opts.files:
-                f.seek(0)
-            collections['case'] = produce_collection_of_samples('case', 'control')
 
             for name, sample_collection in collections.items():
                 setattr(opts, name, sample_collection)
@@ -232,25 +309,26 @@ class CLIExperiment(Parser):
     def produce(self, unknown_args=None):
 
         opts = self.namespace
-        if opts.data:
-            if opts.control or opts.case:
+        data, case, control = opts.data, opts.case, opts.control
+
+        if data:
+            if control or case:
                 raise ValueError('Cannot handle data and case/control at once')
 
-            opts.case = self.data.namespace.case
-            opts.control = self.data.namespace.control
-        elif opts.case and opts.control:
-            # that's nice :)
-            pass
-        elif opts.case:
-            raise ValueError('Control has not been provided!')
-        elif opts.control:
-            raise ValueError('Case has not been provided!')
-        else:
+            case = self.data.namespace.case
+            control = self.data.namespace.control
+
+        elif not (case and control):
+            if case:
+                raise ValueError('Control has not been provided!')
+            if control:
+                raise ValueError('Case has not been provided!')
             raise ValueError('Neither data nor (case & control) have been provided!')
 
-        del opts.data
+        # the data (if given) are now represented by case and control
+        opts.case, opts.control, opts.data = case, control, None
 
-        opts.experiment = Experiment(opts.case.sample_collection, opts.control.sample_collection)
+        opts.experiment = Experiment(case.sample_collection, control.sample_collection)
 
         return opts
 
@@ -258,14 +336,14 @@ class CLIExperiment(Parser):
 class CLI(Parser):
     """The main parser, the one exposed directly to the user."""
 
-    method_name = Argument(choices=Method.members, name='method', optional=False)
+    method_name = Argument(choices=METHODS, name='method', optional=False)
     experiment = CLIExperiment()
     __parsing_order__ = 'breadth-first'
 
     @staticmethod
     def create_method(name):
         # first - take an appropriate method class
-        method = Method.members[name]
+        method = METHODS[name]
 
         # initialize parser for this method
         # (different methods require different arguments)
@@ -274,34 +352,29 @@ class CLI(Parser):
         return method_parser
 
     def parse_args(self, args):
-        help_args = {'-h', '--help'}
-
-        if help_args.intersection(args):
-            args_without_help = [
-                arg
-                for arg in args
-                if arg not in help_args
-            ]
-
-            if len(args_without_help) != 0:
-
-                name = args_without_help[0]
+        # the most common case: no help requested
+        if HELP_ARGS.isdisjoint(args):
+            return super().parse_args(args)
 
-                # in case of a conflict, help for both (for a sub-parser
-                # and for a method) should be displayed.
+        args_without_help = [
+            arg
+            for arg in args
+            if arg not in HELP_ARGS
+        ]
 
-                methods = {
-                    name: ConstructorParser(constructor=method)
-                    for name, method in Method.members.items()
-                }
+        if len(args_without_help) != 0:
 
-                def match_parser(subparsers):
-                    return subparsers.get(name, None)
+            name = args_without_help[0]
 
-                all_subparsers = [methods, self.subparsers, self.lifted_parsers]
+            # methods take precedence; the parser is constructed only for
+            # the requested method (the introspection is not for free)
+            if name in METHODS:
+                parser = self.create_method(name)
+            else:
+                parser = self.subparsers.get(name) or self.lifted_parsers.get(name)
 
-                for parser in filter(bool, map(match_parser, all_subparsers)):
-                    return parser.parse_args(args_without_help[1:] + ['-h'])
+            if parser:
+                return parser.parse_args(args_without_help[1:] + ['-h'])
 
         return super().parse_args(args)
 
@@ -313,9 +386,9 @@ class CLI(Parser):
         # parse arguments
         method_options, remaining_unknown_args = method_parser.parse_known_args(unknown_args)
 
-        for argument in unknown_args[:]:
-            if argument not in remaining_unknown_args:
-                unknown_args.remove(argument)
+        # leave only the arguments which were not consumed by the method
+        # parser; the list is modified in place (it belongs to the caller)
+        unknown_args[:] = remaining_unknown_args
 
         # and initialize the method with these arguments
         options.method = method_parser.constructor(**vars(method_options))
@@ -17,7 +17,7 @@ from methods.gsea.shufflers import PhenotypeShuffler, GeneShuffler
 from methods.method import Method, MethodResult
 from models import Experiment, SampleCollection
 from .metrics import signal_to_noise, RANKING_METRICS
-from .signatures import DatabaseParser, GeneSet
+from .signatures import DatabaseParser, GeneSet, hits_and_ranks
 
 
 class GSEAResult(MethodResult):
@@ -65,6 +65,56 @@ def is_more_extreme(x, enrichment):
     return abs(x) > abs(enrichment)
 
 
+@jit
+def weighted_hits_sum(hits, ranks, p):
+    """Sum of absolute values of p-powered ranks of hits (N_R in publication)."""
+    total = 0.0
+    for i in range(len(ranks)):
+        if hits[i]:
+            total += abs(ranks[i] ** p)
+    return total
+
+
+@jit
+def weighted_running_sum_deviation(hits, ranks, p, hit_denominator, decrement):
+    """Maximum deviation of the running sum statistic weighted by p-powered ranks."""
+    maximum_deviation = 0.0
+    running_sum_statistic_hits = 0.0
+    running_sum_statistic_misses = 0.0
+
+    for i in range(len(ranks)):
+        # hit
+        if hits[i]:
+            running_sum_statistic_hits += ranks[i] ** p / hit_denominator
+        # miss
+        else:
+            running_sum_statistic_misses -= decrement
+
+        diff = running_sum_statistic_hits - running_sum_statistic_misses
+
+        if abs(diff) > abs(maximum_deviation):
+            maximum_deviation = diff
+
+    return maximum_deviation
+
+
+@jit
+def running_sum_deviation(hits, increment, decrement):
+    """Maximum deviation of the (unweighted) running sum statistic."""
+    maximum_deviation = 0.0
+    running_sum_statistic = 0.0
+
+    for i in range(len(hits)):
+        if hits[i]:
+            running_sum_statistic += increment
+        else:
+            running_sum_statistic -= decrement
+        if abs(running_sum_statistic) > abs(maximum_deviation):
+            maximum_deviation = running_sum_statistic
+
+    return maximum_deviation
+
+
 class JavaGSEA(Method):
     # TODO: create wrapper for Desktop version from Broad Institute
     pass
@@ -250,8 +300,9 @@ class GeneralisedGSEA(Method):
         # gene_set is S in the publication
         self.shuffler = self.shuffler_class(
             experiment,
+            ranked_list,
             self.create_ranked_gene_list,
-            self.calculate_enrichment_score,
+            self.calculate_enrichment_score_of_hits
         )
 
         args = (ranked_list, )
@@ -330,27 +381,24 @@ class GeneralisedGSEA(Method):
             reverse=self.descending_sort
         )
 
-    @jit
     def calculate_enrichment_score(self, ranked_list, gene_set: GeneSet):
+        hits, ranks = hits_and_ranks(ranked_list, gene_set)
+        return self.calculate_enrichment_score_of_hits(hits, ranks, gene_set)
+
+    def calculate_enrichment_score_of_hits(self, hits, ranks, gene_set: GeneSet):
+        """Calculate enrichment score for ranks of a ranked list and a mask of gene_set hits in it."""
         # TODO: review of formulas more than welcome;
         # based on formulas from "Appendix: Mathematical Description of Methods"
-        maximum_deviation = 0
-        running_sum_statistic_hits = 0
-        running_sum_statistic_misses = 0
-
         p = self.ranked_list_weight
 
-        n = len(ranked_list)
+        n = len(ranks)
         nh = len(gene_set)
 
         # P_miss(S, i, j)
         decrement = 1 / (n - nh)
 
         # weight, N_R
-        hit_denominator = 0
-        for gene, rank in ranked_list:
-            if gene in gene_set:
-                hit_denominator += abs(pow(rank, p))
+        hit_denominator = weighted_hits_sum(hits, ranks, p)
 
         if not hit_denominator:
             # this means that ranks of all genes with are present
@@ -372,23 +420,7 @@ class GeneralisedGSEA(Method):
             )
             return 0
 
-        for gene, rank in ranked_list:
-
-            # hit
-            if gene in gene_set:
-                power_of_rank = pow(rank, p)
-                increment = power_of_rank / hit_denominator
-                running_sum_statistic_hits += increment
-            # miss
-            else:
-                running_sum_statistic_misses -= decrement
-
-            diff = running_sum_statistic_hits - running_sum_statistic_misses
-
-            if abs(diff) > abs(maximum_deviation):
-                maximum_deviation = diff
-
-        return maximum_deviation
+        return weighted_running_sum_deviation(hits, ranks, p, hit_denominator, decrement)
 
     def enrichments_for_permuted_labels(self, gene_set):
         """Create null distribution by repetitive permutations of gene labels"""
@@ -418,17 +450,12 @@ class GeneralisedGSEA(Method):
         else:
             null = null_distribution.negative_scores
 
-        abs_score = abs(enrichment_score)
-
-        hits = 0
-
-        for random_score in null:
-            if abs(random_score) > abs_score:
-                hits += 1
-
         if not null:
             return 0
 
+        # count more extreme random scores in a single vectorized pass
+        hits = int(np.count_nonzero(np.abs(null) > abs(enrichment_score)))
+
         p_value = hits / len(null)
 
         return p_value
@@ -452,29 +479,48 @@ class GeneralisedGSEA(Method):
             analyzed_gene_sets: already analyzed gene sets
         """
 
-        for gene_set in analyzed_gene_sets:
+        observations = len(analyzed_gene_sets) - 1
+
+        if observations < 1:
+            # there are no other gene sets to compare with
+            for gene_set in analyzed_gene_sets:
+                gene_set.fdr = 0
+            return
+
+        absolute_nulls = [
+            np.abs(np.fromiter(gene_set.null_distribution, dtype=float))
+            for gene_set in analyzed_gene_sets
+        ]
+        absolute_enrichments = np.abs(
+            np.fromiter((gene_set.enrichment for gene_set in analyzed_gene_sets), dtype=float)
+        )
 
-            normalized_enrichment = gene_set.enrichment
+        def count_more_extreme(sorted_values, value):
+            return len(sorted_values) - np.searchsorted(sorted_values, value, side='right')
 
-            more_extreme_random = 0
-            all_random = 0
+        def sort_comparable(values):
+            # NaN is never more extreme than anything, but would be sorted last
+            return np.sort(values[~np.isnan(values)])
 
-            more_extreme_observed = 0
-            observations = 0
+        # values of all distributions, sorted once, so the more extreme
+        # values can be counted with a binary search for each of gene sets
+        all_nulls = np.concatenate(absolute_nulls)
+        total_random = len(all_nulls)
 
-            for other_set in analyzed_gene_sets:
-                if other_set == gene_set:
-                    continue
+        all_nulls = sort_comparable(all_nulls)
+        all_enrichments = sort_comparable(absolute_enrichments)
 
-                more_extreme_random += sum(
-                    1 for random_enrichment in other_set.null_distribution
-                    if is_more_extreme(random_enrichment, normalized_enrichment)
-                )
-                all_random += len(other_set.null_distribution)
+        for gene_set, absolute_enrichment, own_null in zip(analyzed_gene_sets, absolute_enrichments, absolute_nulls):
+
+            # only distributions of the other sets are taken into account
+            more_extreme_random = int(
+                count_more_extreme(all_nulls, absolute_enrichment)
+                - np.count_nonzero(own_null > absolute_enrichment)
+            )
+            all_random = total_random - len(own_null)
 
-                if is_more_extreme(other_set.enrichment, normalized_enrichment):
-                    more_extreme_observed += 1
-                observations += 1
+            # the set itself is never more extreme than itself
+            more_extreme_observed = int(count_more_extreme(all_enrichments, absolute_enrichment))
 
             # this controls division by zero and provides a shortcut to quit if there are no results
             if not more_extreme_random:
@@ -542,25 +588,13 @@ class SimpleGSEA(GeneralisedGSEA):
     database = DatabaseParser()
 
     # TODO: test this
-    def calculate_enrichment_score(self, ranked_list, gene_set):
+    def calculate_enrichment_score_of_hits(self, hits, ranks, gene_set):
         # variable names were chosen to reflect description Supporting Text of GeneralisedGSEA
 
-        maximum_deviation = 0
-        running_sum_statistic = 0
-
-        n = len(ranked_list)
+        n = len(ranks)
         nh = len(gene_set)
 
         increment = sqrt(n - nh) / nh
         decrement = sqrt(nh / (n - nh))
 
-        for gene, _ in ranked_list:
-            if gene in gene_set:
-                running_sum_statistic += increment
-            else:
-                running_sum_statistic -= decrement
-            if abs(running_sum_statistic) > abs(maximum_deviation):
-                maximum_deviation = running_sum_statistic
-
-        return maximum_deviation
-
+        return running_sum_deviation(hits, increment, decrement)
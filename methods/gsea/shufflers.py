@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
 from copy import copy
+
+import numpy as np
 from numpy.random import shuffle
 
-from methods.gsea.signatures import GeneSet
+from methods.gsea.signatures import GeneSet, hits_and_ranks
 from models import SampleCollection, Experiment
 
 
@@ -18,8 +20,17 @@ def shuffle_and_divide(merged_collection, midpoint):
 class Shuffler(ABC):
 
     @abstractmethod
-    def __init__(self, experiment: Experiment, rank, score):
+    def __init__(self, experiment: Experiment, ranked_list, rank, score):
+        """
+
+        Args:
+            experiment: the experiment to be permuted
+            ranked_list: genes of the experiment, ranked with `rank`
+            rank: a function creating ranked list for given case and control
+            score: a function scoring a mask of gene set hits among ranks
+        """
         self.experiment = experiment
+        self.ranked_list = ranked_list
         self.rank = rank
         self.score = score
         self.gene_set = None
@@ -34,8 +45,8 @@ class Shuffler(ABC):
 
 class PhenotypeShuffler(Shuffler):
 
-    def __init__(self, experiment: Experiment, rank, score):
-        super().__init__(experiment, rank, score)
+    def __init__(self, experiment: Experiment, ranked_list, rank, score):
+        super().__init__(experiment, ranked_list, rank, score)
         self.all_samples = experiment.case + experiment.control
         self.cases_cnt = len(experiment.case.samples)
 
@@ -43,23 +54,41 @@ class PhenotypeShuffler(Shuffler):
         random_case, random_control = shuffle_and_divide(self.all_samples, self.cases_cnt)
         ranked_list = self.rank(random_case, random_control)
 
-        return self.score(ranked_list, self.gene_set)
+        hits, ranks = hits_and_ranks(ranked_list, self.gene_set)
+
+        return self.score(hits, ranks, self.gene_set)
 
 
 class GeneShuffler(Shuffler):
 
-    def __init__(self, experiment: Experiment, rank, score):
-        super().__init__(experiment, rank, score)
+    def __init__(self, experiment: Experiment, ranked_list, rank, score):
+        super().__init__(experiment, ranked_list, rank, score)
         self.gene_labels = list(experiment.control.genes)
-        self.permutation = copy(self.gene_labels)
+        # labels are permuted by their positions in gene_labels
+        self.permutation = np.arange(len(self.gene_labels))
 
-    def permute_and_score(self):
-        shuffle(self.permutation)
+        # permuting labels changes neither the ranks nor their order,
+        # so the ranked list of the experiment is used for all permutations
+        label_positions = {gene: i for i, gene in enumerate(self.gene_labels)}
+        self.ranked_positions = np.array([label_positions[gene] for gene, _ in ranked_list], dtype=int)
+        self.ranks = np.fromiter((gene_rank for _, gene_rank in ranked_list), dtype=float, count=len(ranked_list))
+
+        self.label_hits = None
 
-        ranked_list = self.rank(
-            self.experiment.case, self.experiment.control,
-            labels_map=dict(zip(self.gene_labels, self.permutation))
+    def set_gene_set(self, gene_set: GeneSet):
+        super().set_gene_set(gene_set)
+        # membership is checked once per gene set, not once per permutation
+        self.label_hits = np.fromiter(
+            (label in gene_set for label in self.gene_labels),
+            dtype=bool,
+            count=len(self.gene_labels)
         )
-        return self.score(ranked_list, self.gene_set)
 
+    def permute_and_score(self):
+        shuffle(self.permutation)
+
+        # a gene from i-th position of the ranked list gets the label
+        # which was moved to the position of its original label
+        hits = self.label_hits[self.permutation[self.ranked_positions]]
 
+        return self.score(hits, self.ranks, self.gene_set)
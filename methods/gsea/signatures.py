@@ -5,6 +5,8 @@ from urllib.request import urlretrieve
 
 import os
 
+import numpy as np
+
 from declarative_parser.parser import Argument, Parser, action
 from models import Gene
 from utils import jit
@@ -60,6 +62,14 @@ class GeneSet:
         return f'<GeneSet: {self.name} with {len(self.genes)} genes>'
 
 
+def hits_and_ranks(ranked_list, gene_set: GeneSet):
+    """Split ranked list into a boolean mask of gene_set hits and an array of ranks."""
+    n = len(ranked_list)
+    hits = np.fromiter((gene in gene_set for gene, rank in ranked_list), dtype=bool, count=n)
+    ranks = np.fromiter((rank for gene, rank in ranked_list), dtype=float, count=n)
+    return hits, ranks
+
+
 class MolecularSignatureDatabase:
 
     def __init__(self, gene_sets: Mapping[str, GeneSet], label=None):
@@ -1,5 +1,6 @@
 from functools import lru_cache
-from typing import Callable, Mapping, Sequence, List
+from itertools import chain
+from typing import Callable, Iterable, Mapping, Sequence, List
 from warnings import warn
 
 import pandas as pd
@@ -171,6 +172,22 @@ class SampleCollection:
     def __add__(self, other):
         return SampleCollection(self.name, self.samples + other.samples)
 
+    @classmethod
+    def merge(cls, name: str, collections: Iterable['SampleCollection']):
+        """Create a collection with samples from all provided collections.
+
+        Contrary to summing the collections (which copies the samples
+        accumulated so far at every step), the samples are gathered in
+        a single pass.
+
+        Args:
+            name: name of the new collection
+            collections: collections to take samples from (in order)
+        """
+        return cls(name, list(chain.from_iterable(
+            collection.samples for collection in collections
+        )))
+
     @classmethod
     def from_file(
             cls, name, file_object,
@@ -256,7 +273,7 @@ class SampleCollection:
             columns = columns_selector(all_sample_columns)
 
             if reverse_selection:
-                columns = list(columns)
+                columns = set(columns)
                 columns = [c for c in all_sample_columns if c not in columns]
 
             # https://github.com/pandas-dev/pandas/issues/9098#issuecomment-333677100
@@ -1,7 +1,9 @@
 import pytest
 from pytest import fixture
 
-from command_line.main import SingleFileExperimentFactory, CLI
+from declarative_parser.types import Slice, Indices, Range
+
+from command_line.main import SingleFileExperimentFactory, CLI, columns_selection
 from methods import Method
 from models import Sample, Gene
 
@@ -164,7 +166,8 @@ def test_columns_purpose_deduction(test_files):
         'data merged.tsv --control :2',
         'data merged.tsv --control 0,1',
         'data merged.tsv --case 2:',
-        'data merged.tsv --case 2,3'
+        'data merged.tsv --case 2,3',
+        'data merged.tsv --case 2-4'
     ]
     for command in commands:
         opts = p_parse(command)
@@ -173,6 +176,23 @@ def test_columns_purpose_deduction(test_files):
         assert opts.case.sample_collection.samples == expected_cases
 
 
+def test_columns_selection_syntax(test_files):
+
+    expected_types = {
+        '2': Indices,
+        '0,1': Indices,
+        ':2': Slice,
+        '2:': Slice,
+        '1-3': Range
+    }
+    for string, expected_type in expected_types.items():
+        assert isinstance(columns_selection(string), expected_type)
+
+    # tokens not matching any of the syntaxes still lead to a parsing error
+    with parsing_error():
+        p_parse('case t.tsv --columns first control c.tsv')
+
+
 def test_non_tab_delimiter(tmpdir):
 
     create_files(tmpdir, {
@@ -247,6 +267,10 @@ def test_custom_sample_names(test_files):
 
     assert expected_names == sample_names
 
+    # no names given: the default names are used for all the files
+    opts = p_parse('case t.tsv control c.tsv t_2.tsv --header')
+    assert len(opts.control.sample_collection.samples) == 4
+
 
 def test_merged_file(test_files):
     # advanced columns purpose inferring/deduction is tested separately
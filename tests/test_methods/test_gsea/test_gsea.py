@@ -74,6 +74,68 @@ def test_estimate_significance():
     ) == 0
 
 
+def pairwise_fdr(gene_sets):
+    """Reference FDR, comparing each pair of gene sets one by one."""
+    from methods.gsea.gsea import is_more_extreme
+
+    fdrs = []
+
+    for gene_set in gene_sets:
+        more_extreme_random = all_random = 0
+        more_extreme_observed = observations = 0
+
+        for other_set in gene_sets:
+            if other_set is gene_set:
+                continue
+            more_extreme_random += sum(
+                1 for random_enrichment in other_set.null_distribution
+                if is_more_extreme(random_enrichment, gene_set.enrichment)
+            )
+            all_random += len(other_set.null_distribution)
+            if is_more_extreme(other_set.enrichment, gene_set.enrichment):
+                more_extreme_observed += 1
+            observations += 1
+
+        if not more_extreme_random:
+            fdrs.append(0)
+            continue
+
+        nominator = more_extreme_random / all_random
+        denominator = more_extreme_observed / observations
+        fdrs.append(nominator / denominator if denominator else None)
+
+    return fdrs
+
+
+def test_compute_fdr():
+    nan = float('nan')
+    random.seed(0)
+
+    cases = [
+        # ties between enrichments and random scores
+        [(1.5, [1.5, -2, 0.3]), (-1.5, [-1.5, 1, 2.5]), (0.5, [0.5, -0.5, 3])],
+        # random scores which are not a number are never more extreme
+        [(1, [nan, 2, -0.5]), (2, [nan, nan, 3]), (-0.5, [1.5, nan, -1])],
+        # a single gene set
+        [(1, [2, -0.5])],
+        # no gene sets at all
+        []
+    ]
+
+    for case in cases:
+        gene_sets = []
+        for i, (enrichment, null) in enumerate(case):
+            gene_set = GeneSet(f'set {i}', ['TP53'])
+            gene_set.enrichment = enrichment
+            gene_set.null_distribution = ScoreDistribution(null)
+            gene_sets.append(gene_set)
+
+        expected = pairwise_fdr(gene_sets)
+        GeneralisedGSEA.compute_fdr(gene_sets)
+
+        assert [gene_set.fdr for gene_set in gene_sets] == expected
+
+
 def minimal_data():
 
     tp53 = Gene('TP53')
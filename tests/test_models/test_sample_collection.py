@@ -26,6 +26,23 @@ def test_init():
     assert all(isinstance(k, Sample) for k in sample_collection.samples)
 
 
+def test_merge():
+    genes = {Gene('BAD'): 1.2345, Gene('FUCA2'): 6.5432}
+
+    first = SampleCollection('First', [Sample('Tumour_1', genes), Sample('Tumour_2', genes)])
+    second = SampleCollection('Second', [Sample('Tumour_3', genes)])
+
+    merged = SampleCollection.merge('Tumour', [first, second])
+
+    assert merged.name == 'Tumour'
+    assert merged.labels == ['Tumour_1', 'Tumour_2', 'Tumour_3']
+
+    # the merged collections are left untouched
+    assert first.labels == ['Tumour_1', 'Tumour_2']
+
+    assert SampleCollection.merge('Empty', []).samples == []
+
+
 csv_contents = """\
 NAME,NORM-1,GBM-1,GBM-2,OV-1
 TP53,348.61,172.52,236.45,130.2